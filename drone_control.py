@@ -2,12 +2,14 @@ import cv2
 import threading
 import time
 import os
+import argparse
 import pygame
 import matplotlib.pyplot as plt
 from djitellopy import Tello
 from IPython.display import clear_output, display
 from queue import Queue
 from postprocessing import load_and_stitch
+from profiler import StageProfiler
 
 
 # Initialize pygame
@@ -139,14 +141,18 @@ def ask_user(question):
             print("Invalid input.")
 
 
-def perform_image_stitching(input_images_dir):
+def perform_image_stitching(input_images_dir, profiler=None):
     """Stitch the images located in the given directory and save the results in a subfolder."""
     output_dir = os.path.join(input_images_dir, "stitching_results")
-    success = load_and_stitch(input_images_dir, output_dir)
+    success = load_and_stitch(input_images_dir, output_dir, profiler)
     return success
 
 
-def main(image_output_base_dir=os.path.join(".", "output_images")):
+def main(image_output_base_dir=os.path.join(".", "output_images"), profiler=None):
+    # Profiling is disabled unless a profiler is given
+    if profiler is None:
+        profiler = StageProfiler()
+
     # Initialize the Tello drone
     drone = Tello()
     drone.connect()
@@ -189,6 +195,7 @@ def main(image_output_base_dir=os.path.join(".", "output_images")):
     print("Tello Drone Control")
     print("Use W, A, S, D for movement; Shift/Ctrl to move up/down; Q/E to rotate; T to takeoff; L to land; R to record; ESC to quit.")
     print("Press 1 to perform a 360 degree panorama shot.")
+    print("Press P to toggle the stage profiler; O to capture a profile.")
     print("All systems online.")
     print(f"Battery level: {drone.get_battery()}%")
     try:
@@ -200,6 +207,7 @@ def main(image_output_base_dir=os.path.join(".", "output_images")):
                 break
 
             # Capture pygame events
+            events_start = time.perf_counter()
             for event in pygame.event.get():
                 # Handle quit event
                 if event.type == pygame.QUIT and not quit:
@@ -213,6 +221,10 @@ def main(image_output_base_dir=os.path.join(".", "output_images")):
                         quit = True
                     elif command_event.is_set():
                         break
+                    elif event.key == pygame.K_p:
+                        print(f"Stage profiler {'on' if profiler.toggle() else 'off'}")
+                    elif event.key == pygame.K_o:
+                        profiler.start_capture()
                     elif event.key == pygame.K_w:
                         print("Moving forward")
                         forward = 1
@@ -284,6 +296,8 @@ def main(image_output_base_dir=os.path.join(".", "output_images")):
                         up = 0
                     elif event.key in [pygame.K_q, pygame.K_e]:
                         yaw = 0
+            if profiler.enabled:
+                profiler.record("events", time.perf_counter() - events_start)
 
             # Pause manual controls
             if command_event.is_set():
@@ -292,32 +306,40 @@ def main(image_output_base_dir=os.path.join(".", "output_images")):
             # Send control commands
             current_command = (left * movement_speed, forward * movement_speed, up * movement_speed, yaw * rotation_speed)
             if current_command != last_command:
-                drone.send_rc_control(*current_command)
+                with profiler.stage("rc_send"):
+                    drone.send_rc_control(*current_command)
                 last_command = current_command
 
             # Handle video frames
             if not frame_queue.empty():
                 frame = frame_queue.get()
-                frame = cv2.flip(frame, 1)
-                frame_surface = pygame.surfarray.make_surface(frame)
-                frame_surface = pygame.transform.rotate(frame_surface, -90)
-                frame_surface = pygame.transform.scale(frame_surface, screen.get_size())
-                screen.blit(frame_surface, (0, 0))
-                pygame.display.update()
+                with profiler.stage("flip_convert"):
+                    frame = cv2.flip(frame, 1)
+                    frame_surface = pygame.surfarray.make_surface(frame)
+                    frame_surface = pygame.transform.rotate(frame_surface, -90)
+                with profiler.stage("scale"):
+                    frame_surface = pygame.transform.scale(frame_surface, screen.get_size())
+                with profiler.stage("display"):
+                    screen.blit(frame_surface, (0, 0))
+                    pygame.display.update()
 
                 # Save to png
                 if recording_event.is_set():
                     current_time = time.time()
                     time_diff = current_time - last_saved_time
                     if time_diff >= 1:
-                        frame_output = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                         timestamp = str(int(time.time()*1000.0))
                         current_folder_id = get_current_output_folder_id(image_output_base_dir)
                         image_path = os.path.join(image_output_base_dir, str(current_folder_id), f"frame_{timestamp}.png")
-                        cv2.imwrite(image_path, frame_output)
+                        with profiler.stage("imwrite"):
+                            frame_output = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                            cv2.imwrite(image_path, frame_output)
                         print(f"Saved: {image_path}")
                         last_saved_time = current_time
 
+            # Stop a finished profile capture
+            profiler.update()
+
             # Cap the loop rate
             clock.tick(60)
 
@@ -332,6 +354,12 @@ def main(image_output_base_dir=os.path.join(".", "output_images")):
         # Close camera window
         pygame.quit()
 
+        # Stop a running profile capture
+        try:
+            profiler.stop_capture()
+        except Exception as e:
+            print(e)
+
         # Wait for the drone
         print("Waiting for drone to finish...")
         while command_event.is_set():
@@ -351,26 +379,37 @@ def main(image_output_base_dir=os.path.join(".", "output_images")):
             print(e)
 
 
-        # End connection
-        drone.end()
-        print("All systems offline.")
-
-        # Postprocessing
-        current_recording_id = get_current_output_folder_id(image_output_base_dir)
-        if initial_recording_id != current_recording_id:
-            do_stitching = ask_user("Start stitching process now?")
-            if not do_stitching:
-                return
-            for i in range(initial_recording_id, current_recording_id):
-                recording_id = i+1
-                print(f"Working on recording {recording_id}")
-                input_images_dir = os.path.join(image_output_base_dir, str(recording_id))
-                success = perform_image_stitching(input_images_dir)
-                if success:
-                    print("Stitching process complete.")
-                else:
-                    print("Stitching process failed.")
+        try:
+            # End connection
+            drone.end()
+            print("All systems offline.")
+
+            # Postprocessing
+            current_recording_id = get_current_output_folder_id(image_output_base_dir)
+            if initial_recording_id != current_recording_id:
+                do_stitching = ask_user("Start stitching process now?")
+                if not do_stitching:
+                    return
+                for i in range(initial_recording_id, current_recording_id):
+                    recording_id = i+1
+                    print(f"Working on recording {recording_id}")
+                    input_images_dir = os.path.join(image_output_base_dir, str(recording_id))
+                    success = perform_image_stitching(input_images_dir, profiler)
+                    if success:
+                        print("Stitching process complete.")
+                    else:
+                        print("Stitching process failed.")
+        finally:
+            # Profiling summary
+            profiler.write_summary()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Control the Tello drone via keyboard.")
+    parser.add_argument("--profile", action="store_true", help="start with the stage profiler enabled (toggle with P)")
+    parser.add_argument("--profile-capture", choices=StageProfiler.CAPTURE_MODES, default="cprofile", help="profile type captured with O")
+    parser.add_argument("--profile-window", type=float, default=10.0, help="length of a profile capture in seconds")
+    args = parser.parse_args()
+    if args.profile_window <= 0:
+        parser.error("--profile-window must be greater than 0")
+    main(profiler=StageProfiler(enabled=args.profile, capture_mode=args.profile_capture, capture_window=args.profile_window))
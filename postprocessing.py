@@ -1,6 +1,8 @@
 import os
 import glob
+import argparse
 import cv2
+from profiler import StageProfiler
 
 
 def get_image_filenames(directory):
@@ -27,8 +29,10 @@ def stitch_images(image_list):
         return None
 
 
-def load_and_stitch(input_dir, output_dir):
+def load_and_stitch(input_dir, output_dir, profiler=None):
     """Create a series of stitched images and save them to the filesystem."""
+    if profiler is None:
+        profiler = StageProfiler()
     image_paths = get_image_filenames(input_dir)
     if not image_paths:
         print(f"No images available here: {input_dir}")
@@ -38,17 +42,20 @@ def load_and_stitch(input_dir, output_dir):
     image_list = []
     for i, image_path in enumerate(image_paths):
         print(f"{image_path}")
-        image = cv2.imread(image_path)
+        with profiler.stage("imread"):
+            image = cv2.imread(image_path)
         if image is None:
             print(f"Failed to load image: {image_file}")
             continue
         image_list.append(image)
         if len(image_list) < 2:
             continue
-        stitched_image = stitch_images(image_list)
+        with profiler.stage("stitch"):
+            stitched_image = stitch_images(image_list)
         if not stitched_image is None:
             output_path = os.path.join(output_dir, f"stitching_output_{i}.png")
-            cv2.imwrite(output_path, stitched_image)
+            with profiler.stage("stitch_imwrite"):
+                cv2.imwrite(output_path, stitched_image)
             print(f"Saved: {output_path}")
         else:
             return False
@@ -56,6 +63,13 @@ def load_and_stitch(input_dir, output_dir):
 
 
 def main():
+    # Parse arguments
+    parser = argparse.ArgumentParser(description="Stitch the images of a recording.")
+    parser.add_argument("--profile", action="store_true", help="time the stitching stages and write a summary")
+    parser.add_argument("--profile-capture", choices=StageProfiler.CAPTURE_MODES, help="capture a cProfile or sampling profile of the whole run")
+    args = parser.parse_args()
+    profiler = StageProfiler(enabled=args.profile, capture_mode=args.profile_capture or "cprofile")
+
     # Get directories
     base_folder = "output_images"
     recording_id = input("Enter recording id: ").strip()
@@ -63,7 +77,12 @@ def main():
 
     # Do stitching
     stiching_results_dir = os.path.join(input_dir, "stitching_results")
-    stitching_successful = load_and_stitch(input_dir, stiching_results_dir)
+    if args.profile_capture:
+        profiler.start_capture(window=float("inf"))
+    try:
+        stitching_successful = load_and_stitch(input_dir, stiching_results_dir, profiler)
+    finally:
+        profiler.finish()
     if stitching_successful:
         print("Stitching successful.")
     else:
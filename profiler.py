@@ -0,0 +1,201 @@
+import os
+import sys
+import math
+import time
+import cProfile
+import threading
+from collections import Counter
+from contextlib import nullcontext
+
+
+# Shared no-op context returned while stage timing is disabled
+_NULL_STAGE = nullcontext()
+
+
+class _StageTimer:
+    """Context manager that adds its elapsed time to a stage of the profiler."""
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class SamplingProfiler:
+    """Periodically samples the call stack of a single thread from a background thread."""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self.num_samples = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.num_samples += 1
+                self.self_counts[self._describe(frame)] += 1
+                seen = set()
+                while frame is not None:
+                    location = self._describe(frame)
+                    if location not in seen:
+                        self.total_counts[location] += 1
+                        seen.add(location)
+                    frame = frame.f_back
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _describe(frame):
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{frame.f_lineno} ({code.co_name})"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write_report(self, path, limit=30):
+        """Write the most frequently sampled locations to a text file."""
+        with open(path, "w") as f:
+            f.write(f"Samples: {self.num_samples} (interval {self.interval * 1000:.1f} ms)\n\n")
+            for title, counts in (("Self", self.self_counts), ("Total", self.total_counts)):
+                f.write(f"{title}:\n")
+                for location, count in counts.most_common(limit):
+                    share = 100.0 * count / max(self.num_samples, 1)
+                    f.write(f"{share:6.1f}% {count:7d}  {location}\n")
+                f.write("\n")
+
+
+class StageProfiler:
+    """Named stage timers that can be toggled at runtime, plus windowed cProfile/sampling captures."""
+
+    CAPTURE_MODES = ("cprofile", "sample")
+
+    def __init__(self, enabled=False, output_dir=os.path.join(".", "profiles"), capture_mode="cprofile", capture_window=10.0):
+        if capture_mode not in self.CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode: {capture_mode}")
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.capture_mode = capture_mode
+        self.capture_window = capture_window
+        self.stats = {}
+        self._capture = None
+        self._capture_end = 0.0
+
+    def toggle(self):
+        """Switch stage timing on or off and return the new state."""
+        self.enabled = not self.enabled
+        return self.enabled
+
+    def stage(self, name):
+        """Return a context manager timing the named stage (a shared no-op while disabled)."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _StageTimer(self, name)
+
+    def record(self, name, duration):
+        """Add a duration in seconds to the named stage: [count, total, max]."""
+        entry = self.stats.get(name)
+        if entry is None:
+            self.stats[name] = [1, duration, duration]
+        else:
+            entry[0] += 1
+            entry[1] += duration
+            if duration > entry[2]:
+                entry[2] = duration
+
+    def _make_output_path(self, prefix, extension):
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+        timestamp = str(int(time.time()*1000.0))
+        return os.path.join(self.output_dir, f"{prefix}_{timestamp}.{extension}")
+
+    def is_capturing(self):
+        return self._capture is not None
+
+    def start_capture(self, mode=None, window=None):
+        """Start a cProfile or sampling capture of the calling thread for the given window in seconds.
+        An infinite window runs until stop_capture or finish is called."""
+        if self.is_capturing():
+            print("Profile capture already running.")
+            return False
+        mode = mode or self.capture_mode
+        window = self.capture_window if window is None else window
+        if mode == "cprofile":
+            self._capture = cProfile.Profile()
+            self._capture.enable()
+        elif mode == "sample":
+            self._capture = SamplingProfiler(threading.get_ident())
+            self._capture.start()
+        else:
+            raise ValueError(f"Unknown capture mode: {mode}")
+        self._capture_end = time.perf_counter() + window
+        if math.isinf(window):
+            print(f"Started {mode} capture")
+        else:
+            print(f"Started {mode} capture for {window:.1f} s")
+        return True
+
+    def stop_capture(self):
+        """Stop the running capture and write it to the output folder. Returns the file path."""
+        if not self.is_capturing():
+            return None
+        capture = self._capture
+        self._capture = None
+        if isinstance(capture, cProfile.Profile):
+            capture.disable()
+            output_path = self._make_output_path("cprofile", "prof")
+            capture.dump_stats(output_path)
+        else:
+            capture.stop()
+            output_path = self._make_output_path("sample", "txt")
+            capture.write_report(output_path)
+        print(f"Saved profile: {output_path}")
+        return output_path
+
+    def update(self):
+        """Stop the running capture once its window has elapsed. Call this once per loop iteration."""
+        if self._capture is not None and time.perf_counter() >= self._capture_end:
+            self.stop_capture()
+
+    def format_summary(self):
+        """Return a per-stage summary table with times in milliseconds."""
+        lines = [f"{'stage':<24}{'count':>8}{'total':>12}{'mean':>10}{'max':>10}"]
+        for name, (count, total, maximum) in sorted(self.stats.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:<24}{count:>8}{total * 1000:>12.1f}{total / count * 1000:>10.3f}{maximum * 1000:>10.3f}")
+        return "\n".join(lines)
+
+    def write_summary(self):
+        """Print the per-stage summary and save it to the output folder. Returns the file path."""
+        if not self.stats:
+            return None
+        summary = self.format_summary()
+        print(summary)
+        output_path = self._make_output_path("stages", "txt")
+        with open(output_path, "w") as f:
+            f.write(summary + "\n")
+        print(f"Saved stage summary: {output_path}")
+        return output_path
+
+    def finish(self):
+        """End the session: stop any running capture and write the stage summary."""
+        self.stop_capture()
+        return self.write_summary()
@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from profiler import StageProfiler
+
+
+def test_stage_is_noop_while_disabled():
+    profiler = StageProfiler()
+    with profiler.stage("idle"):
+        pass
+    assert profiler.stats == {}
+    assert profiler.stage("a") is profiler.stage("b")
+
+
+def test_stage_records_while_enabled():
+    profiler = StageProfiler()
+    assert profiler.toggle()
+    with profiler.stage("work"):
+        time.sleep(0.001)
+    count, total, maximum = profiler.stats["work"]
+    assert count == 1
+    assert total > 0
+    assert maximum == total
+
+
+def test_record_and_format_summary():
+    profiler = StageProfiler()
+    profiler.record("fast", 0.001)
+    profiler.record("slow", 0.010)
+    profiler.record("slow", 0.030)
+    assert profiler.stats["slow"] == [2, 0.040, 0.030]
+    lines = profiler.format_summary().splitlines()
+    assert lines[0].split() == ["stage", "count", "total", "mean", "max"]
+    # Sorted by total time, slowest first
+    assert lines[1].split() == ["slow", "2", "40.0", "20.000", "30.000"]
+    assert lines[2].split() == ["fast", "1", "1.0", "1.000", "1.000"]
+
+
+def test_write_summary_without_stats(tmp_path):
+    profiler = StageProfiler(output_dir=str(tmp_path / "profiles"))
+    assert profiler.write_summary() is None
+    assert not os.path.exists(profiler.output_dir)
+
+
+def test_sample_capture(tmp_path):
+    profiler = StageProfiler(enabled=True, output_dir=str(tmp_path), capture_mode="sample", capture_window=0.05)
+    assert profiler.start_capture()
+    assert not profiler.start_capture()
+    while profiler.is_capturing():
+        with profiler.stage("loop"):
+            time.sleep(0.01)
+        profiler.update()
+    output_files = sorted(os.listdir(tmp_path))
+    assert len(output_files) == 1
+    assert output_files[0].startswith("sample_")
+    with open(os.path.join(tmp_path, output_files[0])) as f:
+        assert f.readline().startswith("Samples: ")
+    summary_path = profiler.finish()
+    assert os.path.isfile(summary_path)
+
+
+def test_cprofile_capture_until_finish(tmp_path):
+    profiler = StageProfiler(output_dir=str(tmp_path))
+    assert profiler.start_capture(mode="cprofile", window=float("inf"))
+    profiler.update()
+    assert profiler.is_capturing()
+    profiler.finish()
+    assert not profiler.is_capturing()
+    output_files = os.listdir(tmp_path)
+    assert len(output_files) == 1
+    assert output_files[0].startswith("cprofile_")
+    assert os.path.getsize(os.path.join(tmp_path, output_files[0])) > 0